@@ -1,5 +1,19 @@
+import io
+import os
+import gzip
+import math
+import hashlib
+import tempfile
+import weakref
+import threading
+import multiprocessing
+import concurrent.futures
+
 import streamlit as st
 import pandas as pd
+import numpy as np
+
+import score_workers
 
 # ------------------------------
 # Page Config
@@ -19,6 +33,17 @@ THEME_WEIGHTS = {
 }
 
 BONUS_CAP = 10  # max total bonus %
+REVERSE_TOP_K = 3  # best clients listed per maid
+
+# Export formats offered by the download buttons: label -> (file extension, mime)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "Gzip CSV": (".csv.gz", "application/gzip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+EXPORT_CHUNK_ROWS = 50_000  # rows encoded per chunk when writing exports
+EXPORT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "matching_exports")
+EXPORT_CACHE_FILES = 16  # encoded exports kept on disk (oldest are deleted)
 
 # -------------------------------
 # HELPER FUNCTIONS WITH EXPLANATIONS
@@ -304,6 +329,1226 @@ def calculate_score(row):
     return round(final_score, 1), theme_scores, bonus_reasons
 
 
+# -------------------------------
+# CATEGORICAL VOCABULARY (interned once at load time)
+# -------------------------------
+# Single-valued categorical fields are normalized (case, whitespace) and interned
+# into fixed per-column code tables. Every value the rules do not know shares
+# OTHER_CODE, which is exact: the rules treat all unexpected values alike.
+
+OTHER_CODE = 0
+CATEGORY_VALUES = {
+    "clientmts_household_type": ["unspecified", "baby", "many_kids", "baby_and_kids"],
+    "clientmts_special_cases": ["unspecified", "elderly", "special_needs", "elderly_and_special"],
+    "clientmts_pet_type": ["unspecified", "cat", "dog", "both"],
+    "maidmts_household_type": ["unspecified", "refuses_baby", "refuses_many_kids", "refuses_baby_and_kids"],
+    "maidpref_kids_experience": ["unspecified", "lessthan2", "above2", "both"],
+    "maidpref_caregiving_profile": ["unspecified", "elderly_experienced", "special_needs", "elderly_and_special"],
+    "maidmts_pet_type": ["unspecified", "refuses_cat", "refuses_dog", "refuses_both_pets"],
+    "maidpref_pet_handling": ["unspecified", "cats", "dogs", "both"],
+    "maidpref_travel": ["unspecified", "travel", "relocate", "travel_and_relocate"],
+    "maidpref_smoking": ["unspecified", "non_smoker", "smoker"],
+    "maidpref_education": ["unspecified", "school", "university", "both"],
+}
+CATEGORY_CODES = {col: {v: i + 1 for i, v in enumerate(values)} for col, values in CATEGORY_VALUES.items()}
+CLIENT_CODE_COLUMNS = [f"code_{c}" for c in CATEGORY_VALUES if c.startswith("client")]
+MAID_CODE_COLUMNS = [f"code_{c}" for c in CATEGORY_VALUES if not c.startswith("client")]
+
+# Multi-valued fields are normalized too, then parsed into bitsets below
+NORMALIZED_COLUMNS = list(CATEGORY_VALUES) + [
+    "clientmts_living_arrangement", "clientmts_nationality_preference", "clientmts_cuisine_preference",
+    "maidmts_living_arrangement", "maid_grouped_nationality", "maidpref_personality"
+]
+
+NEUTRAL = -1  # marks a theme that does not count towards the weight total
+
+
+def normalize_value(value):
+    # Lowercase, trim and collapse whitespace in every "+"-separated token
+    if not isinstance(value, str):
+        return value
+    return "+".join(" ".join(t.split()).lower() for t in value.split("+"))
+
+
+def normalize_categoricals(df):
+    # Load-time normalization: each distinct value is normalized once
+    out = df.copy()
+    for col in NORMALIZED_COLUMNS:
+        if col in out:
+            codes, uniques = pd.factorize(out[col], use_na_sentinel=False)
+            out[col] = np.array([normalize_value(u) for u in uniques], dtype=object)[codes]
+    return out
+
+
+def category_code(col, value):
+    return CATEGORY_CODES[col].get(normalize_value(value), OTHER_CODE)
+
+
+def _rule_table(rule, *value_lists):
+    # Evaluate a reference rule once per combination of code-table values
+    shape = [len(v) for v in value_lists]
+    scores = np.full(shape, NEUTRAL, dtype=np.int64)
+    reasons = np.empty(shape, dtype=object)
+    for idx in np.ndindex(*shape):
+        s, r = rule(*(values[i] for values, i in zip(value_lists, idx)))
+        reasons[idx] = r
+        if s is not None:
+            scores[idx] = s
+    return scores, reasons
+
+
+# Themes that depend only on single-valued fields: precomputed code → (score, reason) tables
+TABLE_THEMES = {
+    "household_kids": (score_household_kids, ["clientmts_household_type"],
+                       ["maidmts_household_type", "maidpref_kids_experience"]),
+    "special_cases": (score_special_cases, ["clientmts_special_cases"], ["maidpref_caregiving_profile"]),
+    "pets": (score_pets, ["clientmts_pet_type"], ["maidmts_pet_type", "maidpref_pet_handling"]),
+}
+RULE_TABLES = {
+    theme: _rule_table(rule, *[["__other__"] + CATEGORY_VALUES[f] for f in client_fields + maid_fields])
+    for theme, (rule, client_fields, maid_fields) in TABLE_THEMES.items()
+}
+
+
+def table_rule(theme, row):
+    # Scalar (score, reason) lookup for a table theme from a row's code_* columns
+    _, client_fields, maid_fields = TABLE_THEMES[theme]
+    idx = tuple(int(row[f"code_{f}"]) for f in client_fields + maid_fields)
+    scores, reasons = RULE_TABLES[theme]
+    s = int(scores[idx])
+    return (None if s == NEUTRAL else s), reasons[idx]
+
+
+# -------------------------------
+# BITSET ENCODING (parsed once per entity)
+# -------------------------------
+# The score_* functions above are the reference rules. The encoders below parse
+# multi-valued fields into integer bitsets once per distinct value, so the fast
+# scoring paths only need bitwise AND and popcount per pair.
+
+CUISINE_BITS = {"lebanese": 1, "khaleeji": 2, "international": 4}
+MAID_CUISINE_FLAGS = {
+    "maid_cooking_lebanese": CUISINE_BITS["lebanese"],
+    "maid_cooking_khaleeji": CUISINE_BITS["khaleeji"],
+    "maid_cooking_international": CUISINE_BITS["international"]
+}
+
+NATIONALITY_ALIASES = {
+    "filipina": "filipina",
+    "ethiopian maid": "ethiopian",
+    "west african nationality": "west_african"
+}
+KNOWN_NATIONALITIES = ["filipina", "ethiopian", "west_african", "indian"]
+NATIONALITY_ANY = 1  # client accepts any nationality; vocabulary bits start at 2
+
+CLIENT_LIVING_BITS = {
+    "unspecified": 1,   # only set on an exact match
+    "private_room": 2,  # substring checks, as in score_living
+    "abu_dhabi": 4
+}
+# score_living compares these whole values exactly, so token order and duplicates matter
+CLIENT_LIVING_VALUES = {
+    "private_room": 8, "live_out+private_room": 8,                       # private room
+    "private_room+abu_dhabi": 16, "live_out+private_room+abu_dhabi": 16  # Abu Dhabi posting
+}
+CLIENT_LIVING_ROOM, CLIENT_LIVING_ABU_DHABI = 8, 16
+CLIENT_LIVING_TOKENS = {"unspecified", "private_room", "live_out", "abu_dhabi"}
+MAID_LIVING_BITS = {
+    "no_restriction_living_arrangement": 1,  # only set on an exact match
+    "requires_private_room": 2,
+    "refuses_abu_dhabi": 4
+}
+
+PERSONALITY_BITS = {"energetic": 1, "no_attitude": 2, "no_tiktok": 4, "veg_friendly": 8}
+
+# popcount for the 3-bit cuisine sets (vectorized path)
+CUISINE_POPCOUNT = np.array([bin(i).count("1") for i in range(8)], dtype=np.int64)
+
+CLIENT_ENCODED_COLUMNS = [
+    "enc_client_cuisine", "enc_client_cuisine_count",
+    "enc_client_nationality", "enc_client_living"
+] + CLIENT_CODE_COLUMNS
+MAID_ENCODED_COLUMNS = [
+    "enc_maid_cuisine", "enc_maid_nationality",
+    "enc_maid_living", "enc_maid_personality", "enc_maid_bonus"
+] + MAID_CODE_COLUMNS
+# Everything score_bonuses_bits reads
+BONUS_INPUT_COLUMNS = [
+    "num_languages", "years_of_experience", "enc_maid_personality",
+    "code_maidpref_travel", "code_maidpref_smoking", "code_maidpref_education"
+]
+
+
+def _tokens(value):
+    return [t.strip() for t in str(value).split("+")]
+
+
+def parse_client_cuisine(value):
+    # Returns (bits, number of requested cuisines); "unspecified" → (0, 0)
+    if value == "unspecified":
+        return 0, 0
+    prefs = _tokens(value)
+    bits = 0
+    for p in prefs:
+        bits |= CUISINE_BITS.get(p, 0)
+    return bits, len(prefs)
+
+
+def parse_client_nationality(value, vocab):
+    if value == "any":
+        return NATIONALITY_ANY
+    bits = 0
+    for p in _tokens(value):
+        bits |= vocab.get(NATIONALITY_ALIASES.get(p, p), 0)
+    return bits
+
+
+def parse_client_living(value):
+    value = str(value)
+    bits = CLIENT_LIVING_VALUES.get(value, 0)
+    if value == "unspecified":
+        bits |= CLIENT_LIVING_BITS["unspecified"]
+    for token in ["private_room", "abu_dhabi"]:
+        if token in value:
+            bits |= CLIENT_LIVING_BITS[token]
+    return bits
+
+
+def parse_maid_living(value):
+    value = str(value)
+    bits = 0
+    if value == "no_restriction_living_arrangement":
+        bits |= MAID_LIVING_BITS["no_restriction_living_arrangement"]
+    for token in ["requires_private_room", "refuses_abu_dhabi"]:
+        if token in value:
+            bits |= MAID_LIVING_BITS[token]
+    return bits
+
+
+def parse_personality(value):
+    value = str(value).lower()
+    bits = 0
+    for trait, bit in PERSONALITY_BITS.items():
+        if trait in value:
+            bits |= bit
+    return bits
+
+
+def _unknown(values, known, split=_tokens):
+    found = set()
+    for v in pd.unique(values):
+        if pd.isna(v):
+            continue
+        found.update(t for t in split(v) if t and t not in known)
+    return sorted(found)
+
+
+def build_vocabulary(df):
+    # Nationality bit vocabulary + load-time report of values/tokens the rules don't know.
+    # Expects a normalize_categoricals frame; only distinct values are inspected.
+    client_nats = df["clientmts_nationality_preference"] if "clientmts_nationality_preference" in df else pd.Series(dtype=object)
+    maid_nats = df["maid_grouped_nationality"] if "maid_grouped_nationality" in df else pd.Series(dtype=object)
+
+    known_nats = set(KNOWN_NATIONALITIES) | set(NATIONALITY_ALIASES) | {"any"}
+    unknown = {
+        "clientmts_nationality_preference": _unknown(client_nats, known_nats),
+        "maid_grouped_nationality": _unknown(maid_nats, set(KNOWN_NATIONALITIES), split=lambda v: [str(v)]),
+    }
+    if "clientmts_cuisine_preference" in df:
+        unknown["clientmts_cuisine_preference"] = _unknown(
+            df["clientmts_cuisine_preference"], set(CUISINE_BITS) | {"unspecified"})
+    if "clientmts_living_arrangement" in df:
+        unknown["clientmts_living_arrangement"] = _unknown(
+            df["clientmts_living_arrangement"], CLIENT_LIVING_TOKENS)
+    if "maidmts_living_arrangement" in df:
+        unknown["maidmts_living_arrangement"] = _unknown(
+            df["maidmts_living_arrangement"], set(MAID_LIVING_BITS) | {"unspecified"})
+    if "maidpref_personality" in df:
+        unknown["maidpref_personality"] = _unknown(
+            df["maidpref_personality"], set(PERSONALITY_BITS) | {"unspecified", ""})
+
+    for col, codes in CATEGORY_CODES.items():
+        if col in df:
+            unknown[col] = _unknown(df[col], set(codes), split=lambda v: [str(v)])
+
+    # Unknown nationalities still get their own bit so they keep matching exactly
+    tokens = list(KNOWN_NATIONALITIES)
+    for t in unknown["clientmts_nationality_preference"] + unknown["maid_grouped_nationality"]:
+        if t not in tokens:
+            tokens.append(t)
+    if len(tokens) > 62:
+        raise ValueError(f"Too many distinct nationalities for a 64-bit set: {len(tokens)}")
+    vocab = {t: 1 << (i + 1) for i, t in enumerate(tokens)}
+    return vocab, {col: toks for col, toks in unknown.items() if toks}
+
+
+def _map_unique(series, parse):
+    # Parse each distinct value once, then broadcast back to the rows
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    parsed = [parse(u) for u in uniques]
+    return [parsed[c] for c in codes]
+
+
+def encode_clients(df, vocab):
+    out = df.copy()
+    cuisine = _map_unique(out["clientmts_cuisine_preference"], parse_client_cuisine)
+    out["enc_client_cuisine"] = np.array([c[0] for c in cuisine], dtype=np.int64)
+    out["enc_client_cuisine_count"] = np.array([c[1] for c in cuisine], dtype=np.int64)
+    out["enc_client_nationality"] = np.array(
+        _map_unique(out["clientmts_nationality_preference"], lambda v: parse_client_nationality(v, vocab)), dtype=np.int64)
+    out["enc_client_living"] = np.array(
+        _map_unique(out["clientmts_living_arrangement"], parse_client_living), dtype=np.int64)
+    for code_col in CLIENT_CODE_COLUMNS:
+        col = code_col[len("code_"):]
+        out[code_col] = np.array(_map_unique(out[col], lambda v: category_code(col, v)), dtype=np.int64)
+    return out
+
+
+def encode_maids(df, vocab):
+    out = df.copy()
+    cuisine = np.zeros(len(out), dtype=np.int64)
+    for col, bit in MAID_CUISINE_FLAGS.items():
+        cuisine |= np.where(out[col].to_numpy() == 1, bit, 0)
+    out["enc_maid_cuisine"] = cuisine
+    out["enc_maid_nationality"] = np.array(
+        _map_unique(out["maid_grouped_nationality"], lambda v: vocab.get(v, 0)), dtype=np.int64)
+    out["enc_maid_living"] = np.array(
+        _map_unique(out["maidmts_living_arrangement"], parse_maid_living), dtype=np.int64)
+    personality = out["maidpref_personality"] if "maidpref_personality" in out else pd.Series("", index=out.index)
+    out["enc_maid_personality"] = np.array(_map_unique(personality, parse_personality), dtype=np.int64)
+    for code_col in MAID_CODE_COLUMNS:
+        col = code_col[len("code_"):]
+        values = out[col] if col in out else pd.Series("unspecified", index=out.index)
+        out[code_col] = np.array(_map_unique(values, lambda v: category_code(col, v)), dtype=np.int64)
+
+    # Bonus only depends on a few maid fields, so it is computed once per distinct
+    # combination of them and broadcast back (frames may hold one row per tagged pair)
+    inputs = pd.DataFrame({c: out[c] if c in out else 0 for c in BONUS_INPUT_COLUMNS}, index=out.index)
+    codes, uniques = pd.factorize(pd.MultiIndex.from_frame(inputs))
+    bonuses = [score_bonuses_bits(dict(zip(BONUS_INPUT_COLUMNS, u))) for u in uniques]
+    reasons = np.empty(len(bonuses), dtype=object)
+    reasons[:] = [r for _, r in bonuses]
+    out["enc_maid_bonus"] = np.array([b for b, _ in bonuses], dtype=np.int64)[codes]
+    out["enc_maid_bonus_reasons"] = pd.Series(reasons[codes], index=out.index, dtype=object)
+    return out
+
+
+# -------------------------------
+# BITSET SCORING (scalar)
+# -------------------------------
+
+def score_living_bits(client_bits, maid_bits):
+    w = THEME_WEIGHTS["living"]
+    unspecified = client_bits & CLIENT_LIVING_BITS["unspecified"]
+    private_room, abu_dhabi = CLIENT_LIVING_BITS["private_room"], CLIENT_LIVING_BITS["abu_dhabi"]
+
+    if unspecified and maid_bits & MAID_LIVING_BITS["no_restriction_living_arrangement"]:
+        return w, "Match: both sides unrestricted, flexible and compatible"
+    if unspecified:
+        return None, "Neutral: client did not specify living arrangement"
+    if maid_bits & MAID_LIVING_BITS["requires_private_room"] and not client_bits & private_room:
+        return 0, "Mismatch: maid requires private room but client did not offer one"
+    if maid_bits & MAID_LIVING_BITS["refuses_abu_dhabi"] and not client_bits & abu_dhabi:
+        return w, "Match: maid refuses Abu Dhabi and client not in Abu Dhabi"
+    if client_bits & CLIENT_LIVING_ROOM:
+        if maid_bits & MAID_LIVING_BITS["requires_private_room"]:
+            return w, "Match: both client and maid require private room"
+        return w, "Match: private room requirement satisfied"
+    if client_bits & CLIENT_LIVING_ABU_DHABI:
+        if maid_bits & MAID_LIVING_BITS["refuses_abu_dhabi"]:
+            return 0, "Mismatch: maid refuses Abu Dhabi"
+        return w, "Match: Abu Dhabi posting acceptable"
+    return None, "Neutral"
+
+
+def score_nationality_bits(client_bits, maid_bits, client, maid):
+    w = THEME_WEIGHTS["nationality"]
+    if client_bits & NATIONALITY_ANY:
+        return w, f"Match: client accepts any nationality, maid is {maid}"
+    if client_bits & maid_bits:
+        return w, f"Match: client prefers {client}, maid is {maid}"
+    if maid == "indian":
+        return 0, "Mismatch: client does not accept indian nationality"
+    return 0, f"Mismatch: client prefers {client}, maid is {maid}"
+
+
+def score_cuisine_bits(client_bits, client_count, maid_bits):
+    w = THEME_WEIGHTS["cuisine"]
+    if client_count == 0:
+        return None, "Neutral: client did not specify cuisine"
+    matches = (int(client_bits) & int(maid_bits)).bit_count()
+    if matches == 0:
+        return 0, "Mismatch: no requested cuisines matched"
+    if matches == client_count:
+        return w, "Perfect match: all cuisines covered"
+    if client_count == 2 and matches == 1:
+        return int(w * 0.6), "Partial match: 1 of 2 cuisines covered"
+    if client_count == 3:
+        if matches == 2:
+            return int(w * 0.8), "Partial match: 2 of 3 cuisines covered"
+        if matches == 1:
+            return int(w * 0.5), "Weak partial match: 1 of 3 cuisines covered"
+    return int(w * (matches / client_count)), f"Partial match: {matches} of {client_count} cuisines covered"
+
+
+def score_bonuses_bits(row):
+    # Same rules as score_bonuses, reading interned codes and personality bits
+    # (run once per distinct BONUS_INPUT_COLUMNS combination by encode_maids)
+    bonuses, explanations = 0, []
+
+    num_langs = row.get("num_languages", 0)
+    if num_langs > 2:
+        bonuses += 2
+        explanations.append(f"Bonus: speaks {num_langs} languages")
+
+    travel = CATEGORY_CODES["maidpref_travel"]
+    if row["code_maidpref_travel"] in [travel["travel"], travel["relocate"], travel["travel_and_relocate"]]:
+        bonuses += 2
+        explanations.append("Bonus: open to travel/relocation")
+
+    if row["code_maidpref_smoking"] == CATEGORY_CODES["maidpref_smoking"]["non_smoker"]:
+        bonuses += 1
+        explanations.append("Bonus: non-smoker")
+
+    edu, education = row["code_maidpref_education"], CATEGORY_CODES["maidpref_education"]
+    if edu == education["school"]:
+        bonuses += 1
+        explanations.append("Bonus: educated (school level)")
+    elif edu == education["university"]:
+        bonuses += 1
+        explanations.append("Bonus: university-educated")
+    elif edu == education["both"]:
+        bonuses += 2
+        explanations.append("Bonus: school + university educated")
+
+    pers = int(row["enc_maid_personality"])
+    for trait, explanation in [
+        ("energetic", "Bonus: energetic personality"),
+        ("no_attitude", "Bonus: respectful / no attitude"),
+        ("no_tiktok", "Bonus: disciplined / no TikTok use"),
+        ("veg_friendly", "Bonus: vegetarian-friendly"),
+    ]:
+        if pers & PERSONALITY_BITS[trait]:
+            bonuses += 1
+            explanations.append(explanation)
+
+    exp = row.get("years_of_experience", 0)
+    if exp > 5:
+        bonuses += 2
+        explanations.append(f"Bonus: {exp} years of experience")
+
+    return min(bonuses, BONUS_CAP), explanations
+
+
+def calculate_score_encoded(row):
+    # calculate_score for rows carrying the code_*/enc_* columns from encode_clients/encode_maids
+    theme_scores = {}
+    scores, max_weights = [], []
+    themes = [
+        ("household_kids", "Household & Kids Reason", table_rule("household_kids", row)),
+        ("special_cases", "Special Cases Reason", table_rule("special_cases", row)),
+        ("pets", "Pets Reason", table_rule("pets", row)),
+        ("living", "Living Reason",
+         score_living_bits(row["enc_client_living"], row["enc_maid_living"])),
+        ("nationality", "Nationality Reason",
+         score_nationality_bits(row["enc_client_nationality"], row["enc_maid_nationality"],
+                                row["clientmts_nationality_preference"], row["maid_grouped_nationality"])),
+        ("cuisine", "Cuisine Reason",
+         score_cuisine_bits(row["enc_client_cuisine"], row["enc_client_cuisine_count"], row["enc_maid_cuisine"])),
+    ]
+    for theme, label, (s, r) in themes:
+        theme_scores[label] = r
+        if s is not None:
+            scores.append(s)
+            max_weights.append(THEME_WEIGHTS[theme])
+    if not scores:
+        return 0, theme_scores, []
+    base_score = sum(scores) / sum(max_weights) * 100
+    bonus, bonus_reasons = row["enc_maid_bonus"], list(row["enc_maid_bonus_reasons"])
+    final_score = min(base_score + bonus, 100)
+    return round(final_score, 1), theme_scores, bonus_reasons
+
+
+# -------------------------------
+# VECTORIZED SCORING (client blocks × all maids)
+# -------------------------------
+
+SCORE_BLOCK_CELLS = 500_000  # client × maid cells per score block (~65 bytes of temporaries each, ~33 MB)
+
+
+def score_block_rows(n_maids):
+    # Clients per score block, so a block stays within SCORE_BLOCK_CELLS whatever the maid count
+    return max(1, SCORE_BLOCK_CELLS // max(n_maids, 1))
+
+
+def prepare_vector_inputs(clients_enc, maids_enc):
+    # Per-entity code and bitset arrays shared by every client block
+    prepared = {"n_maids": len(maids_enc)}
+    for col in CLIENT_ENCODED_COLUMNS:
+        prepared[col] = clients_enc[col].to_numpy(dtype=np.int64)
+    for col in MAID_ENCODED_COLUMNS:
+        prepared[col] = maids_enc[col].to_numpy(dtype=np.int64)
+    return prepared
+
+
+def _vector_living(c, m):
+    w = THEME_WEIGHTS["living"]
+    pr, ad = CLIENT_LIVING_BITS["private_room"], CLIENT_LIVING_BITS["abu_dhabi"]
+    unspecified = (c & CLIENT_LIVING_BITS["unspecified"]) != 0
+    requires_room = (m & MAID_LIVING_BITS["requires_private_room"]) != 0
+    refuses_ad = (m & MAID_LIVING_BITS["refuses_abu_dhabi"]) != 0
+    ad_posting = (c & CLIENT_LIVING_ABU_DHABI) != 0
+    return np.select(
+        [
+            unspecified & ((m & MAID_LIVING_BITS["no_restriction_living_arrangement"]) != 0),
+            unspecified,
+            requires_room & ((c & pr) == 0),
+            refuses_ad & ((c & ad) == 0),
+            (c & CLIENT_LIVING_ROOM) != 0,
+            ad_posting & refuses_ad,
+            ad_posting,
+        ],
+        [w, NEUTRAL, 0, w, w, 0, w],
+        default=NEUTRAL
+    )
+
+
+def _vector_nationality(c, m):
+    w = THEME_WEIGHTS["nationality"]
+    return np.where(((c & NATIONALITY_ANY) != 0) | ((c & m) != 0), w, 0)
+
+
+def _vector_cuisine(c_bits, c_count, m_bits):
+    w = THEME_WEIGHTS["cuisine"]
+    matches = CUISINE_POPCOUNT[c_bits & m_bits]
+    safe_count = np.where(c_count > 0, c_count, 1)
+    return np.select(
+        [
+            c_count == 0,
+            matches == 0,
+            matches == c_count,
+            (c_count == 2) & (matches == 1),
+            (c_count == 3) & (matches == 2),
+            (c_count == 3) & (matches == 1),
+        ],
+        [NEUTRAL, 0, w, int(w * 0.6), int(w * 0.8), int(w * 0.5)],
+        default=np.trunc(w * (matches / safe_count)).astype(np.int64)
+    )
+
+
+def score_block(prepared, client_idx):
+    # Final Score % matrix for the given clients (rows) against every maid (columns)
+    client_idx = np.asarray(client_idx)
+    shape = (len(client_idx), prepared["n_maids"])
+    total = np.zeros(shape, dtype=np.int64)
+    weight = np.zeros(shape, dtype=np.int64)
+
+    def add(theme, scores):
+        scores = np.broadcast_to(scores, shape)
+        counted = scores != NEUTRAL
+        total[:] += np.where(counted, scores, 0)
+        weight[:] += np.where(counted, THEME_WEIGHTS[theme], 0)
+
+    for theme, (_, client_fields, maid_fields) in TABLE_THEMES.items():
+        index = (tuple(prepared[f"code_{f}"][client_idx][:, None] for f in client_fields)
+                 + tuple(prepared[f"code_{f}"][None, :] for f in maid_fields))
+        add(theme, RULE_TABLES[theme][0][index])
+
+    col = lambda name: prepared[name][client_idx][:, None]
+    add("living", _vector_living(col("enc_client_living"), prepared["enc_maid_living"][None, :]))
+    add("nationality", _vector_nationality(col("enc_client_nationality"), prepared["enc_maid_nationality"][None, :]))
+    add("cuisine", _vector_cuisine(col("enc_client_cuisine"), col("enc_client_cuisine_count"),
+                                   prepared["enc_maid_cuisine"][None, :]))
+
+    raw = np.minimum(total / np.where(weight > 0, weight, 1) * 100 + prepared["enc_maid_bonus"][None, :], 100)
+    raw = np.where(weight > 0, raw, 0.0)
+    # Python's round() on the few distinct values keeps results identical to calculate_score
+    uniques, inverse = np.unique(raw, return_inverse=True)
+    return np.array([round(float(u), 1) for u in uniques])[inverse].reshape(shape)
+
+
+def top_k_maids(scores, k):
+    # Column indices of the k best maids per client; ties keep maid order like sorted()
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return order, np.take_along_axis(scores, order, axis=1)
+
+
+def merge_top_k_clients(best, client_idx, scores, k):
+    # Fold one client block into the running best-k clients per maid (rows = rank).
+    # Earlier clients come first in the candidates, so ties keep client order.
+    order = np.argsort(-scores, axis=0, kind="stable")[:k]
+    return merge_top_k_candidates(best, (client_idx[order], np.take_along_axis(scores, order, axis=0)), k)
+
+
+def merge_top_k_candidates(best, candidates, k):
+    # Same fold for a block's (client index, score) candidates; blocks must come in client order
+    if best is not None:
+        candidates = tuple(np.vstack([b, c]) for b, c in zip(best, candidates))
+    order = np.argsort(-candidates[1], axis=0, kind="stable")[:k]
+    return tuple(np.take_along_axis(c, order, axis=0) for c in candidates)
+
+
+def _explained_match(client_record, maid_record):
+    score, reasons, bonus_reasons = calculate_score_encoded({**client_record, **maid_record})
+    return {
+        "Final Score %": score,
+        **reasons,
+        "Bonus Reasons": ", ".join(bonus_reasons) if bonus_reasons else "None"
+    }
+
+
+def rank_client_block(maid_arrays, maid_records, k, reverse_k, client_arrays, client_records, offset):
+    # One client block against every maid: (top-k matches, reverse-k candidates).
+    # Takes only the block's client arrays and records, so it can run in a worker process.
+    prepared = {**maid_arrays, **client_arrays}
+    local_idx = np.arange(len(client_records))
+    scores = score_block(prepared, local_idx)
+    order, _ = top_k_maids(scores, k)
+    matches = [
+        {
+            "client_index": offset + int(i),
+            "maid_id": maid_records[j]["maid_id"],
+            **_explained_match(client_records[i], maid_records[j])
+        }
+        for i, maid_positions in enumerate(order) for j in maid_positions
+    ]
+    candidates = merge_top_k_clients(None, local_idx + offset, scores, reverse_k) if reverse_k else None
+    return matches, candidates
+
+
+def imap_blocks(func, n_blocks, block_args, shared=(), processes=0):
+    # Yields (block, func(*shared, *block_args(block))) for blocks 0..n_blocks-1.
+    # With processes > 0 the blocks run in a spawn/forkserver process pool (see score_workers)
+    # and arrive in completion order: func must be a module-level app function, shared is
+    # sent once per worker and each block's arguments when it is submitted. Inline otherwise.
+    if processes <= 0 or n_blocks == 0:
+        for block in range(n_blocks):
+            yield block, func(*shared, *block_args(block))
+        return
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    n_workers = min(processes, n_blocks)
+    executor = concurrent.futures.ProcessPoolExecutor(
+        n_workers, mp_context=context,
+        initializer=score_workers.init_worker, initargs=(func.__name__, shared)
+    )
+    try:
+        # A couple of blocks per worker in flight, so block arguments are not all copied up front
+        running, next_block = {}, 0
+        while running or next_block < n_blocks:
+            while next_block < n_blocks and len(running) < 2 * n_workers:
+                running[executor.submit(score_workers.run_block, *block_args(next_block))] = next_block
+                next_block += 1
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield running.pop(future), future.result()  # re-raises worker failures
+    finally:
+        # Stops the workers early when the consumer is cancelled or fails
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_rank_matches(clients_enc, maids_enc, k, reverse_k=0, processes=0, block_rows=None):
+    # Single pass over client blocks: best k maids per client and, from the same
+    # score blocks, best reverse_k clients per maid. Only the winners get explanations.
+    # Blocks may run in worker processes (see imap_blocks) but are folded in client order.
+    # Yields (clients done, matches so far, reverse matches or None until the last block).
+    prepared = prepare_vector_inputs(clients_enc, maids_enc)
+    block_rows = block_rows or score_block_rows(len(maids_enc))
+    client_records = clients_enc.to_dict("records")
+    maid_records = maids_enc.to_dict("records")
+    maid_arrays = {key: prepared[key] for key in ["n_maids"] + MAID_ENCODED_COLUMNS}
+
+    def block_args(block):
+        start, stop = block * block_rows, min((block + 1) * block_rows, len(client_records))
+        client_arrays = {col: prepared[col][start:stop] for col in CLIENT_ENCODED_COLUMNS}
+        return client_arrays, client_records[start:stop], start
+
+    n_blocks = math.ceil(len(client_records) / block_rows)
+    shared = (maid_arrays, maid_records, k, reverse_k)
+    matches, best_clients, pending, next_block = [], None, {}, 0
+    for block, result in imap_blocks(rank_client_block, n_blocks, block_args, shared, processes):
+        pending[block] = result
+        while next_block in pending:
+            block_matches, candidates = pending.pop(next_block)
+            matches.extend(block_matches)
+            if reverse_k:
+                best_clients = merge_top_k_candidates(best_clients, candidates, reverse_k)
+            next_block += 1
+        if next_block < n_blocks:
+            yield min(next_block * block_rows, len(client_records)), matches, None
+
+    reverse_matches = []
+    if best_clients is not None:
+        for j, maid_record in enumerate(maid_records):
+            for rank, i in enumerate(best_clients[0][:, j], start=1):
+                reverse_matches.append({
+                    "maid_id": maid_record["maid_id"],
+                    "Rank": rank,
+                    "client_index": int(i),
+                    **_explained_match(client_records[i], maid_record)
+                })
+    yield len(client_records), matches, reverse_matches
+
+
+def rank_matches(clients_enc, maids_enc, k, reverse_k=0, processes=0, block_rows=None):
+    # Runs iter_rank_matches to completion: (matches, reverse matches)
+    for _, matches, reverse_matches in iter_rank_matches(clients_enc, maids_enc, k, reverse_k, processes, block_rows):
+        pass
+    return matches, reverse_matches
+
+
+def top_k_matches(clients_enc, maids_enc, k):
+    # Best k maids per client
+    return rank_matches(clients_enc, maids_enc, k)[0]
+
+
+# -------------------------------
+# SUMMARY HELPERS
+# -------------------------------
+CLIENT_COLUMNS = [
+    "client_name", "clientmts_household_type", "clientmts_special_cases",
+    "clientmts_pet_type", "clientmts_dayoff_policy",
+    "clientmts_nationality_preference", "clientmts_living_arrangement",
+    "clientmts_cuisine_preference"
+]
+
+MAID_COLUMNS = [
+    "maid_id", "years_of_experience", "maidspeaks_amharic", "maidspeaks_arabic",
+    "maidspeaks_english", "maidspeaks_french", "maidspeaks_oromo",
+    "maid_grouped_nationality", "maid_cooking_khaleeji", "maid_cooking_lebanese",
+    "maid_cooking_international", "maid_cooking_not_specified",
+    "maidmts_household_type", "maidmts_pet_type", "maidmts_dayoff_policy",
+    "maidmts_living_arrangement", "maidpref_education", "maidpref_kids_experience",
+    "maidpref_pet_handling", "maidpref_personality", "maidpref_travel",
+    "maidpref_smoking", "maidpref_caregiving_profile"
+]
+# Scoring inputs carried with the maid columns when the upload has them, so the best
+# matches are scored on the same fields (e.g. the language bonus) as tagged placements
+OPTIONAL_MAID_COLUMNS = ["num_languages"]
+
+REASON_COLUMNS = [
+    "Household & Kids Reason",
+    "Special Cases Reason",
+    "Pets Reason",
+    "Living Reason",
+    "Nationality Reason",
+    "Cuisine Reason"
+]
+
+DRIVER_THEMES = ["Household & Kids", "Special Cases", "Pets", "Living Arrangement", "Nationality", "Cuisine"]
+
+
+UPLIFT_SIDE_COLUMNS = ["maid_id", "Final Score %"] + REASON_COLUMNS + ["Bonus Reasons"]
+UPLIFT_THEMES = [c.replace(" Reason", "") for c in REASON_COLUMNS]
+
+
+@st.cache_data(show_spinner=False)
+def build_uplift_table(tagged_df, best_df):
+    # One row per client, indexed by client_name: first tagged placement joined
+    # with the top algorithmic match, plus the score delta and the themes whose
+    # outcome changed (reason texts also name the maid, so they are not compared)
+    tagged = tagged_df.drop_duplicates("client_name").set_index("client_name")[UPLIFT_SIDE_COLUMNS]
+    best = best_df.drop_duplicates("client_name").set_index("client_name")[UPLIFT_SIDE_COLUMNS]
+    uplift = tagged.add_prefix("Tagged ").join(best.add_prefix("Best "), how="inner").sort_index()
+    uplift["Delta"] = uplift["Best Final Score %"] - uplift["Tagged Final Score %"]
+    changed = np.column_stack([
+        np.array(_map_unique(uplift[f"Tagged {c}"], reason_outcome), dtype=object)
+        != np.array(_map_unique(uplift[f"Best {c}"], reason_outcome), dtype=object)
+        for c in REASON_COLUMNS
+    ]) if len(uplift) else np.zeros((0, len(REASON_COLUMNS)), dtype=bool)
+    uplift["Themes Changed"] = [
+        ", ".join(theme for theme, flag in zip(UPLIFT_THEMES, flags) if flag) for flags in changed
+    ]
+    return uplift
+
+
+def reason_outcome(reason):
+    # Theme outcome from a reason's leading label: "match", "partial", "mismatch" or "neutral"
+    label = str(reason).split(":", 1)[0].strip().lower()
+    if label.startswith("neutral"):
+        return "neutral"
+    if label.startswith("mismatch"):
+        return "mismatch"
+    if "partial" in label:
+        return "partial"
+    return "match"
+
+
+def uplift_side(uplift_row, side):
+    # The "Tagged" or "Best" half of an uplift row, keyed like a results row
+    return {c: uplift_row[f"{side} {c}"] for c in UPLIFT_SIDE_COLUMNS}
+
+
+def classify_theme(reason: str):
+    # Classify a reason into a broad theme
+    r = str(reason).lower()
+    if any(k in r for k in ["baby", "kids", "household"]):
+        return "Household & Kids"
+    if any(k in r for k in ["special", "elderly", "caregiving"]):
+        return "Special Cases"
+    if any(k in r for k in ["pet", "cat", "dog"]):
+        return "Pets"
+    if "living" in r or "room" in r or "abu dhabi" in r:
+        return "Living Arrangement"
+    if "nationality" in r or "prefers" in r:
+        return "Nationality"
+    if "cuisine" in r or "cooking" in r:
+        return "Cuisine"
+    return None
+
+
+def classify_reason(reason: str):
+    # "match", "mismatch" or None, checked in the same order as the driver charts
+    reason_text = str(reason).lower()
+    if any(word in reason_text for word in ["perfect", "bonus", "match", "partial", "good"]):
+        return "match"
+    if any(word in reason_text for word in ["mismatch", "refuses", "not", "bad", "wrong"]):
+        return "mismatch"
+    return None
+
+
+# -------------------------------
+# SAMPLED SUMMARY ESTIMATES
+# -------------------------------
+APPROX_STRATA_COLUMN = "clientmts_household_type"
+APPROX_FIRST_SAMPLE = 500   # tagged pairs / clients scored before the first estimate
+APPROX_GROWTH = 4           # sample size multiplier per refinement stage
+APPROX_Z = 1.96             # 95% confidence intervals
+APPROX_AUTO_ROWS = 200_000  # approximate mode is on by default above this many rows
+APPROX_REFRESH_SECONDS = 2
+
+
+def _stratified_order(strata, rng):
+    # Random permutation of row positions within each stratum
+    codes, uniques = pd.factorize(pd.Series(strata).astype(str))
+    return {h: rng.permutation(np.flatnonzero(codes == i)) for i, h in enumerate(uniques)}
+
+
+def _allocate(order, n):
+    # Proportional allocation of n units, at least two per stratum when available
+    total = sum(len(idx) for idx in order.values())
+    return {
+        h: min(len(idx), max(2, math.ceil(n * len(idx) / total)))
+        for h, idx in order.items()
+    }
+
+
+def stratified_mean(samples, sizes):
+    # Stratified mean with a finite-population-corrected confidence half-width
+    total = sum(sizes.values())
+    mean, var = 0.0, 0.0
+    for h, y in samples.items():
+        n, N = len(y), sizes[h]
+        if n == 0:
+            continue
+        w = N / total
+        mean += w * y.mean()
+        if n > 1:
+            var += w ** 2 * y.var(ddof=1) / n * (1 - n / N)
+    return mean, APPROX_Z * math.sqrt(var)
+
+
+def stratified_ratio(y_samples, x_samples, sizes):
+    # Stratified ratio Σy / Σx (linearized variance), used for theme percentages
+    y_total = sum(sizes[h] * y.mean() for h, y in y_samples.items() if len(y))
+    x_total = sum(sizes[h] * x.mean() for h, x in x_samples.items() if len(x))
+    if x_total == 0:
+        return 0.0, 0.0
+    ratio = y_total / x_total
+    var = 0.0
+    for h, y in y_samples.items():
+        n, N = len(y), sizes[h]
+        if n > 1:
+            d = y - ratio * x_samples[h]
+            var += N ** 2 * (1 - n / N) * d.var(ddof=1) / n
+    return ratio, APPROX_Z * math.sqrt(var) / x_total
+
+
+def _driver_counts(reasons):
+    # Per-pair theme counts for matched and mismatched reasons
+    counts = {"match": np.zeros(len(DRIVER_THEMES)), "mismatch": np.zeros(len(DRIVER_THEMES))}
+    for reason in reasons:
+        kind, theme = classify_reason(reason), classify_theme(reason)
+        if kind and theme:
+            counts[kind][DRIVER_THEMES.index(theme)] += 1
+    return counts["match"], counts["mismatch"]
+
+
+def estimate_summary_stages(pairs_df, clients_df, maids_enc, vocab, top_k=2, seed=0):
+    # Yields progressively refined summary estimates over growing nested stratified
+    # samples: tagged pairs are sampled for the tagged averages and theme drivers,
+    # clients are sampled and ranked against all maids for the best-match average.
+    # Only the sampled rows of pairs_df / clients_df are encoded, stage by stage.
+    rng = np.random.default_rng(seed)
+    pair_order = _stratified_order(pairs_df[APPROX_STRATA_COLUMN], rng)
+    client_order = _stratified_order(clients_df[APPROX_STRATA_COLUMN], rng)
+    pair_sizes = {h: len(idx) for h, idx in pair_order.items()}
+    client_sizes = {h: len(idx) for h, idx in client_order.items()}
+    k = min(top_k, len(maids_enc))
+    block_rows = score_block_rows(len(maids_enc))
+
+    tagged = {h: [] for h in pair_order}
+    matched = {h: [] for h in pair_order}
+    mismatched = {h: [] for h in pair_order}
+    best = {h: [] for h in client_order}
+    taken_pairs = {h: 0 for h in pair_order}
+    taken_clients = {h: 0 for h in client_order}
+
+    n = APPROX_FIRST_SAMPLE
+    while True:
+        for h, target in _allocate(pair_order, n).items():
+            new = pair_order[h][taken_pairs[h]:target]
+            sample_enc = encode_maids(encode_clients(pairs_df.iloc[new], vocab), vocab)
+            for row in sample_enc.to_dict("records"):
+                score, reasons, _ = calculate_score_encoded(row)
+                m, mm = _driver_counts(reasons[c] for c in REASON_COLUMNS)
+                tagged[h].append(score)
+                matched[h].append(m)
+                mismatched[h].append(mm)
+            taken_pairs[h] = max(taken_pairs[h], target)
+
+        for h, target in _allocate(client_order, n).items():
+            new = client_order[h][taken_clients[h]:target]
+            for start in range(0, len(new), block_rows):
+                sample_enc = encode_clients(clients_df.iloc[new[start:start + block_rows]], vocab)
+                prepared = prepare_vector_inputs(sample_enc, maids_enc)
+                _, top_scores = top_k_maids(score_block(prepared, np.arange(len(sample_enc))), k)
+                best[h].extend(top_scores.mean(axis=1))
+            taken_clients[h] = max(taken_clients[h], target)
+
+        arrays = lambda d: {h: np.asarray(v, dtype=float) for h, v in d.items()}
+        matched_arr, mismatched_arr = arrays(matched), arrays(mismatched)
+        drivers = {}
+        for kind, counts in [("match", matched_arr), ("mismatch", mismatched_arr)]:
+            totals = {h: c.sum(axis=1) if len(c) else c for h, c in counts.items()}
+            drivers[kind] = {
+                theme: tuple(100 * v for v in stratified_ratio(
+                    {h: c[:, t] if len(c) else c for h, c in counts.items()}, totals, pair_sizes))
+                for t, theme in enumerate(DRIVER_THEMES)
+            }
+
+        done = taken_pairs == pair_sizes and taken_clients == client_sizes
+        yield {
+            "avg_tagged": stratified_mean(arrays(tagged), pair_sizes),
+            "avg_best": stratified_mean(arrays(best), client_sizes),
+            "match_drivers": drivers["match"],
+            "mismatch_drivers": drivers["mismatch"],
+            "sampled_pairs": sum(taken_pairs.values()),
+            "total_pairs": sum(pair_sizes.values()),
+            "sampled_clients": sum(taken_clients.values()),
+            "total_clients": sum(client_sizes.values()),
+            "progress": sum(taken_pairs.values()) / max(sum(pair_sizes.values()), 1),
+            "done": done,
+        }
+        if done:
+            return
+        n *= APPROX_GROWTH
+
+
+# -------------------------------
+# BACKGROUND JOBS
+# -------------------------------
+JOB_REFRESH_SECONDS = 1
+JOB_PROCESSES = max(1, min(4, (os.cpu_count() or 1) - 1))  # worker processes per scoring job
+PARTIAL_PREVIEW_ROWS = 200  # rows shown while a scoring job is still running
+EXPLAIN_BLOCK_ROWS = 512    # tagged placements explained per job block
+
+
+class Job(dict):
+    # Job state ("cancel", "ready", "latest", "error"); a dict subclass so the registry can hold it weakly
+    pass
+
+
+@st.cache_resource
+def background_jobs():
+    # Process-wide registry that survives script reruns: (kind, fingerprint) -> job.
+    # Sessions hold their jobs in session_state; a job no session holds is dropped
+    # (and its worker stops), so memory is bounded by the datasets sessions have open.
+    return {"lock": threading.Lock(), "jobs": weakref.WeakValueDictionary()}
+
+
+def _hold_job(kind, job):
+    # Keeps a strong reference to this session's current job of each kind
+    held = st.session_state.setdefault("jobs", {})
+    held[kind] = job
+
+
+def start_job(kind, fingerprint, make_stages, inline_first=False):
+    # Returns the job for (kind, fingerprint), starting it in a worker thread if needed.
+    # make_stages() returns a generator of snapshots carrying "progress" and "done";
+    # the latest snapshot is published as job["latest"]. With inline_first the first
+    # snapshot is computed before returning, so there is something to show at once.
+    registry = background_jobs()
+    key = (kind, fingerprint)
+    with registry["lock"]:
+        job = registry["jobs"].get(key)
+        created = job is None
+        if created:
+            job = Job(cancel=threading.Event(), ready=threading.Event(),
+                      latest={"progress": 0.0, "done": False}, error=None)
+            registry["jobs"][key] = job
+    _hold_job(kind, job)
+    if not created:
+        job["ready"].wait()  # another session may be computing the inline first snapshot
+        with registry["lock"]:
+            failed = registry["jobs"].get(key) is not job
+        return start_job(kind, fingerprint, make_stages, inline_first) if failed else job
+
+    # Stages are built outside the registry lock so other jobs and sessions are not blocked
+    try:
+        stages = make_stages()
+        if inline_first:
+            job["latest"] = next(stages)
+    except Exception as e:
+        job["error"] = e
+        with registry["lock"]:
+            registry["jobs"].pop(key, None)
+        raise
+    finally:
+        job["ready"].set()
+
+    job_ref = weakref.ref(job)
+
+    def run():
+        try:
+            for snapshot in stages:
+                current = job_ref()
+                if current is None or current["cancel"].is_set():
+                    return  # cancelled, or no session holds the job any more
+                current["latest"] = snapshot
+                del current
+        except Exception as e:  # surfaced in the UI instead of dying silently
+            current = job_ref()
+            if current is not None:
+                current["error"] = e
+        finally:
+            stages.close()  # stops any worker processes still running
+
+    if not job["latest"]["done"]:
+        threading.Thread(target=run, name=f"{kind}-job", daemon=True).start()
+    return job
+
+
+def drop_job(kind, fingerprint):
+    # Cancels the job and forgets it, so the next start_job for it starts over
+    registry = background_jobs()
+    with registry["lock"]:
+        job = registry["jobs"].pop((kind, fingerprint), None)
+    if job is not None:
+        job["cancel"].set()
+        if st.session_state.get("jobs", {}).get(kind) is job:
+            del st.session_state["jobs"][kind]
+
+
+def release_job(kind):
+    # Drops this session's hold on its job of this kind; it stops once no session holds it
+    st.session_state.get("jobs", {}).pop(kind, None)
+
+
+def job_status(job, kind, fingerprint, label):
+    # Progress bar with Cancel / Restart controls for a running job
+    latest = job["latest"]
+    if job["error"] is not None:
+        st.error(f"{label} failed: {job['error']}")
+    elif job["cancel"].is_set():
+        st.warning(f"{label} cancelled at {latest['progress']:.0%}.")
+    else:
+        st.progress(latest["progress"], text=f"{label}… {latest['progress']:.0%}")
+        if st.button("Cancel", key=f"cancel_{kind}"):
+            job["cancel"].set()
+            st.rerun()
+    if job["error"] is not None or job["cancel"].is_set():
+        if st.button("Restart", key=f"restart_{kind}"):
+            drop_job(kind, fingerprint)
+            st.rerun(scope="app")
+
+
+def job_running(job):
+    # Still scoring (not finished, cancelled or failed)?
+    return not job["latest"]["done"] and not job["cancel"].is_set() and job["error"] is None
+
+
+def _explain_rows(rows_enc):
+    # Tab 1 rows for a block of encoded tagged pairs
+    results = []
+    for row in rows_enc.to_dict("records"):
+        score, reasons, bonus_reasons = calculate_score_encoded(row)
+        results.append({
+            "client_name": row["client_name"],
+            "maid_id": row["maid_id"],
+            "Final Score %": score,
+            **reasons,
+            "Bonus Reasons": ", ".join(bonus_reasons) if bonus_reasons else "None"
+        })
+    return pd.DataFrame(results)
+
+
+def score_tagged_stages(master_df, vocab, processes=JOB_PROCESSES):
+    # Tab 1 job: explains every tagged placement, one block of rows per snapshot
+    # (blocks run in worker processes, so the UI thread keeps the GIL)
+    pairs_enc = encode_maids(encode_clients(master_df, vocab), vocab)
+    n_blocks = math.ceil(len(pairs_enc) / EXPLAIN_BLOCK_ROWS)
+    block_args = lambda block: (pairs_enc.iloc[block * EXPLAIN_BLOCK_ROWS:(block + 1) * EXPLAIN_BLOCK_ROWS],)
+    blocks, scored = {}, 0
+    for block, rows in imap_blocks(_explain_rows, n_blocks, block_args, processes=processes):
+        blocks[block] = rows
+        scored += len(rows)
+        yield {"progress": scored / len(pairs_enc), "scored": scored, "preview": rows, "done": False}
+    # The final snapshot only keeps the frame: it is held as long as a session shows it
+    results_df = pd.concat([blocks.pop(b) for b in sorted(blocks)], ignore_index=True) if n_blocks else pd.DataFrame()
+    yield {"progress": 1.0, "done": True, "results_df": results_df}
+
+
+def _optimal_rows(client_names, matches):
+    return [{
+        "client_name": client_names[match["client_index"]],
+        "maid_id": match["maid_id"],
+        "Final Score %": match["Final Score %"],
+        "Household & Kids Reason": match["Household & Kids Reason"],
+        "Special Cases Reason": match["Special Cases Reason"],
+        "Pets Reason": match["Pets Reason"],
+        "Living Reason": match["Living Reason"],
+        "Nationality Reason": match["Nationality Reason"],
+        "Cuisine Reason": match["Cuisine Reason"],
+        "Bonus Reasons": match["Bonus Reasons"]
+    } for match in matches]
+
+
+def optimal_matching_stages(clients_df, maids_df, vocab, k=2, processes=JOB_PROCESSES):
+    # Tab 2 job: top k maids per client (partial results per client block) and,
+    # from the same pass, the best clients per maid once all blocks are done
+    client_names = clients_df["client_name"].to_numpy()
+    stages = iter_rank_matches(encode_clients(clients_df, vocab), encode_maids(maids_df, vocab),
+                               k, REVERSE_TOP_K, processes)
+    for clients_done, matches, reverse_matches in stages:
+        if reverse_matches is None:
+            yield {"progress": clients_done / max(len(clients_df), 1), "matches": matches,
+                   "client_names": client_names, "done": False}
+    best_clients = pd.DataFrame(reverse_matches)
+    if not best_clients.empty:
+        best_clients.insert(2, "client_name", client_names[best_clients.pop("client_index")])
+    yield {"progress": 1.0, "done": True,
+           "optimal_df": pd.DataFrame(_optimal_rows(client_names, matches)), "maid_best_clients_df": best_clients}
+
+
+def estimate_job_stages(master_df, clients_df, maids_enc, vocab):
+    return estimate_summary_stages(master_df, clients_df, maids_enc, vocab)
+
+
+# -------------------------------
+# EXPORT HELPERS
+# -------------------------------
+
+def dataset_fingerprint(df):
+    # Stable content hash used as the cache key for exports
+    hashed = pd.util.hash_pandas_object(df, index=False).values
+    columns = "|".join(map(str, df.columns)).encode("utf-8")
+    return hashlib.sha1(columns + hashed.tobytes()).hexdigest()
+
+
+def _encode_export(df, export_format, path):
+    # Writes df to path chunk by chunk, so no full encoded copy is held in memory
+    if export_format == "Parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(path, schema, compression="snappy") as writer:
+            for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+                chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        return
+
+    with open(path, "wb") as raw:
+        sink = gzip.GzipFile(fileobj=raw, mode="wb") if export_format == "Gzip CSV" else raw
+        text = io.TextIOWrapper(sink, encoding="utf-8", newline="")
+        for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+            chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+            chunk.to_csv(text, index=False, header=(start == 0))
+        text.flush()
+        text.detach()
+        if sink is not raw:
+            sink.close()
+
+
+def _evict_exports():
+    # Keeps the EXPORT_CACHE_FILES most recent encoded exports on disk
+    paths = [os.path.join(EXPORT_CACHE_DIR, f) for f in os.listdir(EXPORT_CACHE_DIR) if not f.endswith(".part")]
+    for path in sorted(paths, key=os.path.getmtime, reverse=True)[EXPORT_CACHE_FILES:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # already removed by another session
+
+
+def export_dataframe(df, export_format):
+    # Encoded once per dataset fingerprint and format into a temp file; returned opened for reading
+    extension, _ = EXPORT_FORMATS[export_format]
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_CACHE_DIR, f"{dataset_fingerprint(df)}{extension}")
+    if not os.path.exists(path):
+        partial = f"{path}.{os.getpid()}-{threading.get_ident()}.part"
+        _encode_export(df, export_format, partial)
+        os.replace(partial, path)
+        _evict_exports()
+    return open(path, "rb")
+
+
+def export_download_button(label, df, base_name, export_format, **kwargs):
+    # Exports are only encoded when the button is clicked
+    extension, mime = EXPORT_FORMATS[export_format]
+    return st.download_button(
+        label,
+        data=lambda: export_dataframe(df, export_format),
+        file_name=f"{base_name}{extension}",
+        mime=mime,
+        on_click="ignore",
+        **kwargs
+    )
+
+
+def load_saved_export(base_name):
+    # Fallback loader: accepts any of the export formats written above
+    for extension, _ in EXPORT_FORMATS.values():
+        path = f"{base_name}{extension}"
+        if os.path.exists(path):
+            if extension == ".parquet":
+                return pd.read_parquet(path)
+            return pd.read_csv(path)
+    return None
+
+
+# -------------------------------
+# UPLOAD (read and preprocessed once per file)
+# -------------------------------
+
+def load_upload(uploaded_file):
+    # Reading, normalization, vocabulary, fingerprint and the deduplicated client/maid
+    # frames run once per uploaded file; reruns of the same session reuse them until a
+    # different file is uploaded
+    upload_id = getattr(uploaded_file, "file_id", None) or uploaded_file.name
+    upload = st.session_state.get("upload")
+    if upload is None or upload["id"] != upload_id:
+        st.session_state.pop("upload", None)  # release the previous file before reading the new one
+        df = pd.read_csv(uploaded_file) if uploaded_file.name.endswith(".csv") else pd.read_excel(uploaded_file)
+        master_df = normalize_categoricals(df)
+        vocab, unknown_tokens = build_vocabulary(master_df)
+        clients_df = master_df[CLIENT_COLUMNS].drop_duplicates(subset=["client_name"]).reset_index(drop=True)
+        maid_columns = MAID_COLUMNS + [c for c in OPTIONAL_MAID_COLUMNS if c in master_df]
+        maids_df = master_df[maid_columns].drop_duplicates(subset=["maid_id"]).reset_index(drop=True)
+        upload = {
+            "id": upload_id,
+            "master_df": master_df,
+            "vocab": vocab,
+            "unknown_tokens": unknown_tokens,
+            "fingerprint": dataset_fingerprint(master_df),
+            "clients_df": clients_df,
+            "maids_df": maids_df,
+            "maids_enc": encode_maids(maids_df, vocab),  # Tab 3 ranks against these on every click
+        }
+        st.session_state["upload"] = upload
+    return upload
+
+
 # -------------------------------
 # STREAMLIT APP
 # -------------------------------
@@ -311,99 +1556,149 @@ st.title("Client–Maid Matching Score Calculator")
 
 uploaded_file = st.file_uploader("Upload your dataset (CSV or Excel)", type=["csv", "xlsx"])
 if uploaded_file:
-    df = pd.read_csv(uploaded_file) if uploaded_file.name.endswith(".csv") else pd.read_excel(uploaded_file)
-    master_df = df.copy()
+    upload = load_upload(uploaded_file)
+    master_df, fingerprint = upload["master_df"], upload["fingerprint"]
+    vocab, unknown_tokens = upload["vocab"], upload["unknown_tokens"]
+    clients_df, maids_df = upload["clients_df"], upload["maids_df"]
+    if unknown_tokens:
+        with st.expander(f"⚠️ Unexpected values found in {len(unknown_tokens)} field(s) at load time"):
+            for col, tokens in unknown_tokens.items():
+                st.write(f"**{col}:** {', '.join(tokens)}")
+    export_format = st.radio("Export format", list(EXPORT_FORMATS), horizontal=True)
+    approximate_mode = st.toggle(
+        "Approximate Summary Metrics (sampled, refined in the background)",
+        value=len(master_df) >= APPROX_AUTO_ROWS
+    )
     # Create tabs
     tab1, tab2, tab3, tab4, tab5 = st.tabs(["Matching Scores", "Optimal Matches","Customer Interface", "Maid Profile Explorer", "Summary Metrics"])
 
+    # Full scoring runs in background jobs that Tabs 1, 2 and 5 poll
+    tagged_job = start_job("tagged", fingerprint, lambda: score_tagged_stages(master_df, vocab))
+    optimal_job = start_job("optimal", fingerprint, lambda: optimal_matching_stages(clients_df, maids_df, vocab))
+    exact_ready = tagged_job["latest"]["done"] and optimal_job["latest"]["done"]
+
+    # ---------------- Tab 5 (approximate): rendered until the full scoring is done ----------------
+    if exact_ready:
+        drop_job("estimate", fingerprint)  # exact Summary Metrics supersede the estimate
+    elif not approximate_mode:
+        release_job("estimate")
+    else:
+        with tab5:
+            estimate_job = start_job(
+                "estimate", fingerprint,
+                lambda: estimate_job_stages(master_df, clients_df, upload["maids_enc"], vocab), inline_first=True
+            )
+
+            @st.fragment(run_every=APPROX_REFRESH_SECONDS)
+            def approximate_summary():
+                estimate = estimate_job["latest"]
+                st.subheader("Summary Metrics (Approximate)")
+                if estimate_job["error"] is not None:
+                    st.error(f"Background refinement stopped: {estimate_job['error']}")
+                st.progress(
+                    estimate["sampled_pairs"] / max(estimate["total_pairs"], 1),
+                    text=(
+                        f"Sampled {estimate['sampled_pairs']:,} of {estimate['total_pairs']:,} tagged pairs, "
+                        f"{estimate['sampled_clients']:,} of {estimate['total_clients']:,} clients"
+                        + (" (complete)" if estimate["done"] else " (refining…)")
+                    )
+                )
+
+                avg_tagged, tagged_ci = estimate["avg_tagged"]
+                avg_best, best_ci = estimate["avg_best"]
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Avg Tagged Match Score", f"{avg_tagged:.1f}% ± {tagged_ci:.1f}")
+                with col2:
+                    st.metric("Avg Best Match Score", f"{avg_best:.1f}% ± {best_ci:.1f}")
+                with col3:
+                    st.metric("Potential Improvement", f"{avg_best - avg_tagged:+.1f}%")
+                st.caption(
+                    "Estimates from a stratified random sample (strata: client household type) "
+                    "with 95% confidence intervals. They tighten as more of the data is scored."
+                )
+
+                col1, col2 = st.columns(2)
+                for col, kind, title in [(col1, "mismatch_drivers", "Top Drivers of Mismatch"),
+                                         (col2, "match_drivers", "Top Drivers of Match")]:
+                    with col:
+                        st.markdown(f"**{title}**")
+                        drivers = pd.DataFrame(
+                            [(theme, pct, ci) for theme, (pct, ci) in estimate[kind].items() if pct > 0],
+                            columns=["Theme", "Percent", "± CI"]
+                        ).sort_values("Percent", ascending=False)
+                        st.dataframe(drivers.round(1), hide_index=True)
+
+            approximate_summary()
+
     # ---------------- Tab 1: Existing Matching ----------------
     with tab1:
         st.write("### Matching Scores (Key Fields Only)")
-        results = []
-        for _, row in df.iterrows():
-            score, reasons, bonus_reasons = calculate_score(row)
-            result_row = {
-                "client_name": row["client_name"],
-                "maid_id": row["maid_id"],
-                "Final Score %": score,
-                **reasons,
-                "Bonus Reasons": ", ".join(bonus_reasons) if bonus_reasons else "None"
-            }
-            results.append(result_row)
-        results_df = pd.DataFrame(results)
-        st.dataframe(results_df)
-
-        st.write("### Detailed Explanations")
-        pair_options = results_df.apply(lambda r: f"{r['client_name']} ↔ {r['maid_id']} ({r['Final Score %']}%)", axis=1)
-        selected_pair = st.selectbox("Select a Client–Maid Pair", pair_options)
-
-        if selected_pair:
-            row = results_df.iloc[pair_options.tolist().index(selected_pair)]
-            st.subheader(f"Explanation for {row['client_name']} ↔ {row['maid_id']}")
-            st.write("**Household & Kids:**", row["Household & Kids Reason"])
-            st.write("**Special Cases:**", row["Special Cases Reason"])
-            st.write("**Pets:**", row["Pets Reason"])
-            st.write("**Living:**", row["Living Reason"])
-            st.write("**Nationality:**", row["Nationality Reason"])
-            st.write("**Cuisine:**", row["Cuisine Reason"])
-            st.write("**Bonus:**", row["Bonus Reasons"])
-
-        # Save Tab 1 results in memory for later tabs
-        st.session_state["results_df"] = results_df
+        # Scoring runs in a background job; this tab polls it until it finishes
+        results_df = tagged_job["latest"].get("results_df")
+
+        if results_df is None:
+            @st.fragment(run_every=JOB_REFRESH_SECONDS if job_running(tagged_job) else None)
+            def tagged_progress():
+                if tagged_job["latest"]["done"]:
+                    st.rerun(scope="app")
+                job_status(tagged_job, "tagged", fingerprint, "Scoring tagged placements")
+                latest = tagged_job["latest"]
+                st.caption(f"{latest.get('scored', 0):,} placements scored so far (latest {PARTIAL_PREVIEW_ROWS} shown).")
+                st.dataframe(latest.get("preview", pd.DataFrame()).tail(PARTIAL_PREVIEW_ROWS))
+
+            tagged_progress()
+        else:
+            st.dataframe(results_df)
+
+            st.write("### Detailed Explanations")
+            pair_options = results_df.apply(lambda r: f"{r['client_name']} ↔ {r['maid_id']} ({r['Final Score %']}%)", axis=1)
+            selected_pair = st.selectbox("Select a Client–Maid Pair", pair_options)
+
+            if selected_pair:
+                row = results_df.iloc[pair_options.tolist().index(selected_pair)]
+                st.subheader(f"Explanation for {row['client_name']} ↔ {row['maid_id']}")
+                st.write("**Household & Kids:**", row["Household & Kids Reason"])
+                st.write("**Special Cases:**", row["Special Cases Reason"])
+                st.write("**Pets:**", row["Pets Reason"])
+                st.write("**Living:**", row["Living Reason"])
+                st.write("**Nationality:**", row["Nationality Reason"])
+                st.write("**Cuisine:**", row["Cuisine Reason"])
+                st.write("**Bonus:**", row["Bonus Reasons"])
+
+            # Save Tab 1 results in memory for later tabs
+            st.session_state["results_df"] = results_df
         
-        # Existing download button
-        st.download_button(
-            "Download Results CSV",
-            results_df.to_csv(index=False).encode("utf-8"),
-            "matching_results.csv",
-            "text/csv"
-        )    
+            # Existing download button
+            export_download_button(
+                f"Download Results ({export_format})",
+                results_df,
+                "matching_results",
+                export_format
+            )
 
     # ---------------- Tab 2: Optimal Matches ----------------
     # ---------------- Preprocessing Step ----------------
     # Keep only relevant columns
     with tab2:
-        client_cols = [
-            "client_name", "clientmts_household_type", "clientmts_special_cases",
-            "clientmts_pet_type", "clientmts_dayoff_policy",
-            "clientmts_nationality_preference", "clientmts_living_arrangement",
-            "clientmts_cuisine_preference"
-        ]
-        
-        maid_cols = [
-            "maid_id", "years_of_experience", "maidspeaks_amharic", "maidspeaks_arabic",
-            "maidspeaks_english", "maidspeaks_french", "maidspeaks_oromo",
-            "maid_grouped_nationality", "maid_cooking_khaleeji", "maid_cooking_lebanese",
-            "maid_cooking_international", "maid_cooking_not_specified",
-            "maidmts_household_type", "maidmts_pet_type", "maidmts_dayoff_policy",
-            "maidmts_living_arrangement", "maidpref_education", "maidpref_kids_experience",
-            "maidpref_pet_handling", "maidpref_personality", "maidpref_travel",
-            "maidpref_smoking", "maidpref_caregiving_profile"
-        ]
-        
-        # Split into clients and maids
-        # clients_df = df[client_cols].drop_duplicates(subset=["client_name"]).reset_index(drop=True)
-        # maids_df = df[maid_cols].drop_duplicates(subset=["maid_id"]).reset_index(drop=True)
-        clients_df = master_df[client_cols].drop_duplicates(subset=["client_name"]).reset_index(drop=True)
-        maids_df = master_df[maid_cols].drop_duplicates(subset=["maid_id"]).reset_index(drop=True)
-        
+        # Clients and maids are split and deduplicated once per upload (load_upload)
         st.write(f" Deduplication complete: {len(clients_df)} unique clients, {len(maids_df)} unique maids.")
 
         # -------------------------------
         # Download buttons for deduplicated data
         # -------------------------------
-        st.download_button(
-            label="Download Deduplicated Clients CSV",
-            data=clients_df.to_csv(index=False).encode("utf-8"),
-            file_name="deduplicated_clients.csv",
-            mime="text/csv"
+        export_download_button(
+            f"Download Deduplicated Clients ({export_format})",
+            clients_df,
+            "deduplicated_clients",
+            export_format
         )
         
-        st.download_button(
-            label="Download Deduplicated Maids CSV",
-            data=maids_df.to_csv(index=False).encode("utf-8"),
-            file_name="deduplicated_maids.csv",
-            mime="text/csv"
+        export_download_button(
+            f"Download Deduplicated Maids ({export_format})",
+            maids_df,
+            "deduplicated_maids",
+            export_format
         )
 
         # Preview clients_df
@@ -418,66 +1713,61 @@ if uploaded_file:
 
         st.write("### Optimal Matches (Top 2 Maids per Client)")
     
-        @st.cache_data
-        def compute_optimal_matches(clients_df, maids_df):
-            results = []
-            for _, client_row in clients_df.iterrows():
-                candidate_scores = []
-                for _, maid_row in maids_df.iterrows():
-                    combined_row = {**client_row.to_dict(), **maid_row.to_dict()}
-                    score, reasons, bonus_reasons = calculate_score(combined_row)
-                    candidate_scores.append({
-                        "maid_id": maid_row["maid_id"],
-                        "Final Score %": score,
-                        **reasons,
-                        "Bonus Reasons": ", ".join(bonus_reasons) if bonus_reasons else "None"
-                    })
-                # pick top 2
-                top_matches = sorted(candidate_scores, key=lambda x: x["Final Score %"], reverse=True)[:2]
-                for match in top_matches:
-                    results.append({
-                        "client_name": client_row["client_name"],
-                        "maid_id": match["maid_id"],
-                        "Final Score %": match["Final Score %"],
-                        "Household & Kids Reason": match["Household & Kids Reason"],
-                        "Special Cases Reason": match["Special Cases Reason"],
-                        "Pets Reason": match["Pets Reason"],
-                        "Living Reason": match["Living Reason"],
-                        "Nationality Reason": match["Nationality Reason"],
-                        "Cuisine Reason": match["Cuisine Reason"],
-                        "Bonus Reasons": match["Bonus Reasons"]
-                    })
-            return pd.DataFrame(results)
-    
-        # Run cached optimal matches
-        optimal_df = compute_optimal_matches(clients_df, maids_df)
-        st.dataframe(optimal_df)
-    
-        # Dropdown for explanations
-        pair_options = optimal_df.apply(
-            lambda r: f"{r['client_name']} ↔ {r['maid_id']} ({r['Final Score %']}%)", axis=1
-        )
-        selected_pair = st.selectbox("Select a Client–Maid Pair for Detailed Explanation", pair_options)
-    
-        if selected_pair:
-            row = optimal_df.iloc[pair_options.tolist().index(selected_pair)]
-            st.subheader(f"Explanation for {row['client_name']} ↔ {row['maid_id']}")
-            st.write("**Household & Kids:**", row["Household & Kids Reason"])
-            st.write("**Special Cases:**", row["Special Cases Reason"])
-            st.write("**Pets:**", row["Pets Reason"])
-            st.write("**Living:**", row["Living Reason"])
-            st.write("**Nationality:**", row["Nationality Reason"])
-            st.write("**Cuisine:**", row["Cuisine Reason"])
-            st.write("**Bonus:**", row["Bonus Reasons"])
+        # Optimal matching runs in a background job; partial top-k shows per client block
+        optimal_df = optimal_job["latest"].get("optimal_df")
+        maid_best_clients_df = optimal_job["latest"].get("maid_best_clients_df")
+    
+        if optimal_df is None:
+            @st.fragment(run_every=JOB_REFRESH_SECONDS if job_running(optimal_job) else None)
+            def optimal_progress():
+                latest = optimal_job["latest"]
+                if latest["done"]:
+                    st.rerun(scope="app")
+                job_status(optimal_job, "optimal", fingerprint, "Finding optimal matches")
+                partial = latest.get("matches", [])[-PARTIAL_PREVIEW_ROWS:]
+                st.caption(f"Partial results: latest {len(partial)} matches from completed client blocks.")
+                st.dataframe(pd.DataFrame(_optimal_rows(latest.get("client_names"), partial)))
+
+            optimal_progress()
+        else:
+            st.dataframe(optimal_df)
+    
+            # Dropdown for explanations
+            pair_options = optimal_df.apply(
+                lambda r: f"{r['client_name']} ↔ {r['maid_id']} ({r['Final Score %']}%)", axis=1
+            )
+            selected_pair = st.selectbox("Select a Client–Maid Pair for Detailed Explanation", pair_options)
+    
+            if selected_pair:
+                row = optimal_df.iloc[pair_options.tolist().index(selected_pair)]
+                st.subheader(f"Explanation for {row['client_name']} ↔ {row['maid_id']}")
+                st.write("**Household & Kids:**", row["Household & Kids Reason"])
+                st.write("**Special Cases:**", row["Special Cases Reason"])
+                st.write("**Pets:**", row["Pets Reason"])
+                st.write("**Living:**", row["Living Reason"])
+                st.write("**Nationality:**", row["Nationality Reason"])
+                st.write("**Cuisine:**", row["Cuisine Reason"])
+                st.write("**Bonus:**", row["Bonus Reasons"])
         
-        # Save Tab 2 optimal matches in memory for later tabs
-        st.session_state["optimal_df"] = optimal_df
-        st.download_button(
-            "Download Optimal Matches CSV",
-            optimal_df.to_csv(index=False).encode("utf-8"),
-            "optimal_matches.csv",
-            "text/csv"
-        )
+            # Save Tab 2 optimal matches in memory for later tabs
+            st.session_state["optimal_df"] = optimal_df
+            export_download_button(
+                f"Download Optimal Matches ({export_format})",
+                optimal_df,
+                "optimal_matches",
+                export_format
+            )
+
+            # Reverse view: best clients per maid (computed in the same pass as above)
+            st.write(f"### Best Clients per Maid (Top {REVERSE_TOP_K})")
+            st.dataframe(maid_best_clients_df)
+            st.session_state["maid_best_clients_df"] = maid_best_clients_df
+            export_download_button(
+                f"Download Best Clients per Maid ({export_format})",
+                maid_best_clients_df,
+                "maid_best_clients",
+                export_format
+            )
     
 
 
@@ -510,18 +1800,10 @@ if uploaded_file:
                 "clientmts_cuisine_preference": cuisine_pref
             }
     
-            results = []
-            for _, maid_row in maids_df.iterrows():
-                row = {**client_row, **maid_row.to_dict()}
-                score, reasons, bonus_reasons = calculate_score(row)
-                results.append({
-                    "maid_id": maid_row["maid_id"],
-                    "Final Score %": score,
-                    **reasons,
-                    "Bonus Reasons": ", ".join(bonus_reasons) if bonus_reasons else "None"
-                })
-    
-            top_matches = sorted(results, key=lambda x: x["Final Score %"], reverse=True)[:3]
+            client_enc = encode_clients(pd.DataFrame([client_row]), vocab)
+            top_matches = top_k_matches(client_enc, upload["maids_enc"], 3)
+            for match in top_matches:
+                match.pop("client_index")
             top_df = pd.DataFrame(top_matches)
             st.dataframe(top_df)
     
@@ -540,8 +1822,8 @@ if uploaded_file:
     with tab4:
         st.subheader("Maid Profile Explorer")
     
-        # Deduplicate by maid_id
-        maids_df = df.drop_duplicates(subset=["maid_id"]).copy()
+        # Deduplicate by maid_id (normalized values, so groups match what scoring sees)
+        maids_df = master_df.drop_duplicates(subset=["maid_id"]).copy()
         maids_df = maids_df.loc[:, ~maids_df.columns.duplicated()]
     
         # Detect maid-related columns (exclude irrelevant ones)
@@ -553,6 +1835,25 @@ if uploaded_file:
     
         # Detect language-related columns
         lang_cols = [c for c in maids_df.columns if c.startswith("maidspeaks_")]
+
+        def show_best_clients(mid):
+            # Reverse matches for this maid, from Tab 2's optimal matching pass
+            st.markdown("#### Best Clients for This Maid")
+            if maid_best_clients_df is None:
+                st.write("Available once Optimal Matches (Tab 2) finishes scoring.")
+                return
+            best = maid_best_clients_df[maid_best_clients_df["maid_id"] == mid] if not maid_best_clients_df.empty else maid_best_clients_df
+            if best.empty:
+                st.write("No client matches available.")
+            for _, match in best.iterrows():
+                st.markdown(f"**#{match['Rank']} {match['client_name']} → {match['Final Score %']}%**")
+                st.write("- Household & Kids:", match["Household & Kids Reason"])
+                st.write("- Special Cases:", match["Special Cases Reason"])
+                st.write("- Pets:", match["Pets Reason"])
+                st.write("- Living:", match["Living Reason"])
+                st.write("- Nationality:", match["Nationality Reason"])
+                st.write("- Cuisine:", match["Cuisine Reason"])
+                st.write("- Bonus:", match["Bonus Reasons"])
     
         # Group explorer
         st.markdown("### Group Maids by Feature")
@@ -576,6 +1877,7 @@ if uploaded_file:
                             for col in maid_cols + lang_cols:
                                 value = maid_row[col]
                                 st.markdown(f"**{col.replace('_', ' ').capitalize()}:** {value}")
+                            show_best_clients(mid)
     
         else:
             # Normal grouping for all other features
@@ -590,27 +1892,29 @@ if uploaded_file:
                             for col in maid_cols + lang_cols:
                                 value = maid_row[col]
                                 st.markdown(f"**{col.replace('_', ' ').capitalize()}:** {value}")
+                            show_best_clients(mid)
 
 
     # --------------------------------------------
     # Bridge: Prepare data for Summary Metrics tab
     # --------------------------------------------
-    import os
-    
     df, best_client_df = None, None
     
     # Try to reuse in-memory results from Tabs 1 and 2
-    if "results_df" in locals() and "Final Score %" in results_df.columns:
+    if results_df is not None and "Final Score %" in results_df.columns:
         df = results_df.copy()
     
-    if "optimal_df" in locals() and "Final Score %" in optimal_df.columns:
+    if optimal_df is not None and "Final Score %" in optimal_df.columns:
         best_client_df = optimal_df.copy()
     
-    # ✅ Fallback: if app restarted, load from saved CSVs
-    if df is None and os.path.exists("matching_results.csv"):
-        df = pd.read_csv("matching_results.csv")
-    if best_client_df is None and os.path.exists("optimal_matches.csv"):
-        best_client_df = pd.read_csv("optimal_matches.csv")
+    # Background scoring still running (not cancelled or failed)?
+    scoring_in_progress = job_running(tagged_job) or job_running(optimal_job)
+    
+    # ✅ Fallback: if app restarted, load from saved exports (CSV, gzip CSV or Parquet)
+    if df is None and not job_running(tagged_job):
+        df = load_saved_export("matching_results")
+    if best_client_df is None and not job_running(optimal_job):
+        best_client_df = load_saved_export("optimal_matches")
     
     # ✅ Ensure numeric type for score columns
     if df is not None and "Final Score %" in df.columns:
@@ -634,12 +1938,18 @@ if uploaded_file:
         st.subheader("Summary Metrics")
     
         # --- Safety: ensure datasets are available
-        if df is None or best_client_df is None:
+        if (df is None or best_client_df is None) and scoring_in_progress:
+            st.info("⏳ Tabs 1 and 2 are still scoring in the background. Summary Metrics appear when they finish.")
+        elif df is None or best_client_df is None:
             st.warning("⚠️ Run Tab 1 (Matching Scores) and Tab 2 (Optimal Matches) before viewing Summary Metrics.")
         else:
             # ✅ Debug check (temporary)
             st.write(f"Tagged: {len(df)}, Best: {len(best_client_df)}")
     
+            # Per-client uplift: one keyed join of tagged placements and best matches
+            uplift_df = build_uplift_table(df, best_client_df)
+            improved_clients = int((uplift_df["Delta"] > 0).sum())
+    
             # --- Safety: ensure columns exist
             if "match_score_pct" not in df.columns or "match_score_pct" not in best_client_df.columns:
                 st.error("Required column 'match_score_pct' not found. Please compute match scores first.")
@@ -667,9 +1977,38 @@ if uploaded_file:
                 with col3:
                     st.metric("Potential Improvement", f"{delta:+.1f}%")
                     st.caption(
-                        "The uplift margin between current and optimal alignment, a direct measure of operational headroom." 
-                        "Across all placements, moree than 2,300 clients experienced improved match quality under algorithmic optimization."
+                        "The uplift margin between current and optimal alignment, a direct measure of operational headroom. "
+                        f"Across all placements, {improved_clients:,} of {len(uplift_df):,} clients experienced improved match quality "
+                        "under algorithmic optimization."
                     )
+
+            # -------------------------------
+            # Per-Client Uplift
+            # -------------------------------
+            st.markdown("### 📈 Per-Client Uplift: Tagged vs Best")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                min_delta = st.number_input("Minimum score change (%)", value=-100.0, step=5.0)
+            with col2:
+                theme_filter = st.multiselect("Changed themes include", UPLIFT_THEMES)
+            with col3:
+                sort_by = st.selectbox("Sort by", ["Delta", "Tagged Final Score %", "Best Final Score %"])
+    
+            uplift_view = uplift_df[uplift_df["Delta"] >= min_delta]
+            if theme_filter:
+                uplift_view = uplift_view[uplift_view["Themes Changed"].apply(
+                    lambda themes: all(t in themes.split(", ") for t in theme_filter)
+                )]
+            st.dataframe(
+                uplift_view.sort_values(sort_by, ascending=False)[[
+                    "Tagged maid_id", "Tagged Final Score %", "Best maid_id", "Best Final Score %",
+                    "Delta", "Themes Changed"
+                ]]
+            )
+            st.caption(
+                f"{len(uplift_view):,} of {len(uplift_df):,} clients shown. Themes Changed lists themes whose outcome "
+                "(match, partial, mismatch or neutral) differs. Click a column header to re-sort."
+            )
     
             # -------------------------------
             # Client Drilldown: Tagged vs Best
@@ -680,16 +2019,16 @@ if uploaded_file:
             if df is None or best_client_df is None:
                 st.warning("⚠️ Run Tab 1 (Matching Scores) and Tab 2 (Optimal Matches) before viewing this section.")
             else:
-                # Select a client name present in both datasets
-                common_clients = sorted(set(df["client_name"]).intersection(best_client_df["client_name"]))
-                if not common_clients:
+                # Clients present in both datasets (the uplift table index)
+                if uplift_df.empty:
                     st.info("No overlapping clients found between Tagged and Best datasets.")
                 else:
-                    drill_client = st.selectbox("Choose a client to compare", common_clients)
+                    drill_client = st.selectbox("Choose a client to compare", uplift_df.index)
             
-                    # Retrieve tagged and best rows
-                    tagged_row = df[df["client_name"] == drill_client].iloc[0]
-                    best_row = best_client_df[best_client_df["client_name"] == drill_client].iloc[0]
+                    # Retrieve tagged and best rows with a keyed lookup
+                    uplift_row = uplift_df.loc[drill_client]
+                    tagged_row = uplift_side(uplift_row, "Tagged")
+                    best_row = uplift_side(uplift_row, "Best")
             
                     col1, col2 = st.columns(2)
             
@@ -742,44 +2081,16 @@ if uploaded_file:
             from collections import Counter
             import plotly.express as px
             
-            # Combine all theme explanation columns
-            reason_columns = [
-                "Household & Kids Reason",
-                "Special Cases Reason",
-                "Pets Reason",
-                "Living Reason",
-                "Nationality Reason",
-                "Cuisine Reason"
-            ]
-            
-            # --- Classify reasons into broad themes ---
-            def classify_theme(reason: str):
-                r = str(reason).lower()
-                if any(k in r for k in ["baby", "kids", "household"]):
-                    return "Household & Kids"
-                if any(k in r for k in ["special", "elderly", "caregiving"]):
-                    return "Special Cases"
-                if any(k in r for k in ["pet", "cat", "dog"]):
-                    return "Pets"
-                if "living" in r or "room" in r or "abu dhabi" in r:
-                    return "Living Arrangement"
-                if "nationality" in r or "prefers" in r:
-                    return "Nationality"
-                if "cuisine" in r or "cooking" in r:
-                    return "Cuisine"
-                return None
-            
             # --- Extract all reasons and classify ---
             match_reasons, mismatch_reasons = [], []
             
             for _, row in df.iterrows():
-                for col in reason_columns:
-                    reason_text = str(row[col]).lower()
-            
-                    if any(word in reason_text for word in ["perfect", "bonus", "match", "partial", "good"]):
-                        match_reasons.append(classify_theme(reason_text))
-                    elif any(word in reason_text for word in ["mismatch", "refuses", "not", "bad", "wrong"]):
-                        mismatch_reasons.append(classify_theme(reason_text))
+                for col in REASON_COLUMNS:
+                    kind = classify_reason(row[col])
+                    if kind == "match":
+                        match_reasons.append(classify_theme(row[col]))
+                    elif kind == "mismatch":
+                        mismatch_reasons.append(classify_theme(row[col]))
             
             # Filter out None
             match_reasons = [r for r in match_reasons if r]
@@ -0,0 +1,30 @@
+"""
+Worker-process side of the app's background scoring jobs.
+
+app.imap_blocks runs job blocks in a spawn (or forkserver) process pool.
+Streamlit executes app.py as __main__, so its functions cannot be pickled by
+reference; the pool runs the functions below instead, and each worker imports
+the app once to look up the block function by name. Workers receive only the
+arrays and records a block needs, never the session's frames. (Because
+Streamlit registers app.py as __main__, a new worker first re-runs it as
+__mp_main__; with no upload in the worker that is the same bare-mode import.)
+"""
+import logging
+import os
+
+_block = {"func": None, "shared": ()}
+
+
+def init_worker(func_name, shared):
+    # Pool initializer: imports the app (bare mode: no upload, so no UI runs; its
+    # st.* warnings are silenced) and keeps the arguments every block shares
+    os.nice(5)  # below the UI process
+    logging.disable(logging.WARNING)
+    import app
+    logging.disable(logging.NOTSET)
+    _block["func"] = getattr(app, func_name)
+    _block["shared"] = shared
+
+
+def run_block(*args):
+    return _block["func"](*_block["shared"], *args)
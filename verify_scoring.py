@@ -0,0 +1,217 @@
+"""
+Differential verification of the fast scoring engines against calculate_score.
+
+Runs the reference rules (calculate_score / score_*) side by side with
+  - the bitset scalar engine (calculate_score_encoded),
+  - the vectorized block engine (score_block),
+  - the top-k ranking built on it (rank_matches, inline and in worker processes),
+on exhaustive per-theme grids of every categorical value the rules look at
+(every token order and duplicate where the rules compare whole values), plus
+randomized full rows, one run spanning several client blocks. Inputs go
+through the app's load-time normalization first, as uploads do. Any score or reason mismatch is printed
+with the exact input; the exit code is 1 if anything differs.
+
+Usage: python verify_scoring.py [--seed N] [--clients N] [--maids N]
+                          [--block-rows N] [--block-clients N] [--block-maids N]
+"""
+import argparse
+import itertools
+import logging
+import random
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Importing the app runs it in Streamlit's bare mode: the upload widget returns
+# None so no UI runs, but every st.* call logs a warning. Silence those.
+logging.disable(logging.WARNING)
+import app  # noqa: E402
+logging.disable(logging.NOTSET)
+
+# -------------------------------
+# INPUT DOMAINS
+# -------------------------------
+# Every value referenced by the score_* rules, plus unexpected ones that must fall through.
+
+def _joins(tokens, sizes):
+    return ["+".join(c) for n in sizes for c in itertools.combinations(tokens, n)]
+
+
+def _sequences(tokens, sizes):
+    # Every ordering, duplicates included: the rules compare some values exactly
+    return ["+".join(c) for n in sizes for c in itertools.product(tokens, repeat=n)]
+
+
+CLIENT_DOMAINS = {
+    "clientmts_household_type": ["unspecified", "baby", "many_kids", "baby_and_kids", "other", " Baby "],
+    "clientmts_special_cases": ["unspecified", "elderly", "special_needs", "elderly_and_special", "other"],
+    "clientmts_pet_type": ["unspecified", "cat", "dog", "both", "other", "CAT"],
+    "clientmts_living_arrangement": (
+        ["unspecified"] + _sequences(["private_room", "live_out", "abu_dhabi"], [1, 2, 3])
+        + ["garden", "no_private_room", "Private_Room + Abu_Dhabi", "Abu_Dhabi+Private_Room"]
+    ),
+    "clientmts_nationality_preference": (
+        ["any", "Any", "Ethiopian  Maid", "any+filipina", "filipina+filipina", "kenyan+indian+filipina"]
+        + _joins(["filipina", "ethiopian maid", "west african nationality", "indian", "kenyan"], [1, 2, 3])
+    ),
+    "clientmts_cuisine_preference": (
+        ["unspecified"] + _sequences(["lebanese", "khaleeji", "international"], [1, 2, 3])
+        + ["lebanese+thai", "thai", "lebanese+khaleeji+thai", "Lebanese + Khaleeji"]
+    ),
+}
+
+MAID_DOMAINS = {
+    "maidmts_household_type": ["unspecified", "refuses_baby", "refuses_many_kids", "refuses_baby_and_kids", "other"],
+    "maidpref_kids_experience": ["unspecified", "lessthan2", "above2", "both", "other", "Above2 "],
+    "maidpref_caregiving_profile": ["unspecified", "elderly_experienced", "special_needs", "elderly_and_special", "other"],
+    "maidmts_pet_type": ["unspecified", "refuses_cat", "refuses_dog", "refuses_both_pets", "other"],
+    "maidpref_pet_handling": ["unspecified", "cats", "dogs", "both", "other"],
+    "maidmts_living_arrangement": (
+        ["unspecified"]
+        + _sequences(["no_restriction_living_arrangement", "requires_private_room", "refuses_abu_dhabi"], [1, 2])
+    ),
+    "maid_grouped_nationality": ["filipina", "ethiopian", "west_african", "indian", "kenyan", "other", "Filipina"],
+    "maid_cooking_lebanese": [0, 1],
+    "maid_cooking_khaleeji": [0, 1],
+    "maid_cooking_international": [0, 1],
+    "num_languages": [0, 2, 3],
+    "maidpref_travel": ["unspecified", "travel", "relocate", "travel_and_relocate", "Travel", "no_travel"],
+    "maidpref_smoking": ["unspecified", "non_smoker", "smoker", "NON_SMOKER"],
+    "maidpref_education": ["unspecified", "school", "university", "both", "none"],
+    "maidpref_personality": (
+        ["", "unspecified", "Energetic", "calm"]
+        + _joins(["energetic", "no_attitude", "no_tiktok", "veg_friendly"], [1, 2, 3, 4])
+        + ["veg_friendly+energetic", "energetic+energetic"]
+    ),
+    "years_of_experience": [0, 5, 6],
+}
+
+# Baseline values for the fields a grid does not vary
+CLIENT_BASE = {field: values[0] for field, values in CLIENT_DOMAINS.items()}
+MAID_BASE = {field: values[0] for field, values in MAID_DOMAINS.items()}
+
+# Per-theme exhaustive grids: (client fields, maid fields) crossed in full
+THEME_GRIDS = {
+    "household_kids": (["clientmts_household_type"], ["maidmts_household_type", "maidpref_kids_experience"]),
+    "special_cases": (["clientmts_special_cases"], ["maidpref_caregiving_profile"]),
+    "pets": (["clientmts_pet_type"], ["maidmts_pet_type", "maidpref_pet_handling"]),
+    "living": (["clientmts_living_arrangement"], ["maidmts_living_arrangement"]),
+    "nationality": (["clientmts_nationality_preference"], ["maid_grouped_nationality"]),
+    "cuisine": (["clientmts_cuisine_preference"],
+                ["maid_cooking_lebanese", "maid_cooking_khaleeji", "maid_cooking_international"]),
+    "bonuses": ([], ["num_languages", "maidpref_travel", "maidpref_smoking", "maidpref_education",
+                     "maidpref_personality", "years_of_experience"]),
+}
+
+
+def _grid(base, domains, fields, prefix):
+    rows = []
+    for values in itertools.product(*(domains[f] for f in fields)):
+        rows.append({**base, **dict(zip(fields, values)), prefix: f"{prefix}_{len(rows)}"})
+    return pd.DataFrame(rows)
+
+
+def _random_rows(base, domains, n, rng, prefix):
+    return pd.DataFrame([
+        {**base, **{f: rng.choice(v) for f, v in domains.items()}, prefix: f"{prefix}_{i}"}
+        for i in range(n)
+    ])
+
+
+# -------------------------------
+# DIFFERENTIAL CHECK
+# -------------------------------
+
+def compare_engines(name, clients_df, maids_df, top_k=2, reverse_k=3, block_rows=None, max_reports=10):
+    # Scores every client × maid pair with each engine and reports differences
+    clients_df = app.normalize_categoricals(clients_df)
+    maids_df = app.normalize_categoricals(maids_df)
+    vocab, _ = app.build_vocabulary(pd.concat([clients_df, maids_df], axis=1))
+    clients_enc = app.encode_clients(clients_df, vocab)
+    maids_enc = app.encode_maids(maids_df, vocab)
+    client_records = clients_enc.to_dict("records")
+    maid_records = maids_enc.to_dict("records")
+
+    matrix = app.score_block(app.prepare_vector_inputs(clients_enc, maids_enc), np.arange(len(clients_enc)))
+    mismatches = []
+    reference = np.zeros(matrix.shape)
+    for i, client in enumerate(client_records):
+        for j, maid in enumerate(maid_records):
+            row = {**client, **maid}
+            expected = app.calculate_score(row)
+            reference[i, j] = expected[0]
+            encoded = app.calculate_score_encoded(row)
+            if encoded != expected:
+                mismatches.append(("bitset scalar", row, expected, encoded))
+            if matrix[i, j] != expected[0]:
+                mismatches.append(("vectorized", row, expected[0], matrix[i, j]))
+
+    # Top-k in both directions must agree with a stable sort of the reference scores
+    matches, reverse_matches = app.rank_matches(clients_enc, maids_enc, top_k, reverse_k, block_rows=block_rows)
+    expected_top = [
+        (i, maid_records[j]["maid_id"], reference[i, j])
+        for i in range(len(client_records))
+        for j in sorted(range(len(maid_records)), key=lambda j: -reference[i, j])[:top_k]
+    ]
+    got_top = [(m["client_index"], m["maid_id"], m["Final Score %"]) for m in matches]
+    if got_top != expected_top:
+        mismatches.append(("top-k maids", None, expected_top[:top_k * 3], got_top[:top_k * 3]))
+    expected_reverse = [
+        (maid_records[j]["maid_id"], i, reference[i, j])
+        for j in range(len(maid_records))
+        for i in sorted(range(len(client_records)), key=lambda i: -reference[i, j])[:reverse_k]
+    ]
+    got_reverse = [(m["maid_id"], m["client_index"], m["Final Score %"]) for m in reverse_matches]
+    if got_reverse != expected_reverse:
+        mismatches.append(("top-k clients", None, expected_reverse[:reverse_k * 3], got_reverse[:reverse_k * 3]))
+
+    # Blocks ranked in worker processes must give the same lists as the inline pass
+    if block_rows and len(client_records) > block_rows:
+        ranked = app.rank_matches(clients_enc, maids_enc, top_k, reverse_k, processes=2, block_rows=block_rows)
+        if ranked != (matches, reverse_matches):
+            mismatches.append(("worker processes", None, "same matches as inline", "different matches"))
+
+    pairs = len(client_records) * len(maid_records)
+    print(f"{name:<16} {pairs:>8,} pairs  {len(mismatches)} mismatches")
+    for engine, row, expected, got in mismatches[:max_reports]:
+        print(f"  [{engine}] expected {expected!r}\n  {'':>{len(engine) + 2}} got      {got!r}")
+        if row is not None:
+            inputs = {k: v for k, v in row.items() if k in CLIENT_DOMAINS or k in MAID_DOMAINS}
+            print(f"  input: {inputs}")
+    return len(mismatches)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clients", type=int, default=150, help="random clients")
+    parser.add_argument("--maids", type=int, default=150, help="random maids")
+    parser.add_argument("--block-rows", type=int, default=512, help="clients per score block in the multi-block run")
+    parser.add_argument("--block-clients", type=int, default=2 * 512 + 37,
+                        help="random clients for the multi-block run (more than --block-rows)")
+    parser.add_argument("--block-maids", type=int, default=40, help="random maids for the multi-block run")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for theme, (client_fields, maid_fields) in THEME_GRIDS.items():
+        clients_df = _grid(CLIENT_BASE, CLIENT_DOMAINS, client_fields, "client_name")
+        maids_df = _grid(MAID_BASE, MAID_DOMAINS, maid_fields, "maid_id")
+        failures += compare_engines(theme, clients_df, maids_df)
+
+    rng = random.Random(args.seed)
+    clients_df = _random_rows(CLIENT_BASE, CLIENT_DOMAINS, args.clients, rng, "client_name")
+    maids_df = _random_rows(MAID_BASE, MAID_DOMAINS, args.maids, rng, "maid_id")
+    failures += compare_engines(f"random (seed {args.seed})", clients_df, maids_df)
+
+    # Several client blocks, so the reverse top-k merge across blocks is exercised
+    clients_df = _random_rows(CLIENT_BASE, CLIENT_DOMAINS, args.block_clients, rng, "client_name")
+    maids_df = _random_rows(MAID_BASE, MAID_DOMAINS, args.block_maids, rng, "maid_id")
+    failures += compare_engines("random (blocks)", clients_df, maids_df, block_rows=args.block_rows)
+
+    print("OK" if failures == 0 else f"FAILED: {failures} mismatches")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())